@@ -0,0 +1,415 @@
+"""
+Replays recorded price ticks through the bot's entry/exit rules.
+
+    python backtest.py ticks.csv
+    python backtest.py ticks.csv --tp 1.2,1.5,2,3 --sl 0.5,0.7,0.8 --workers 4
+    python backtest.py ticks.csv --replay        # tick-by-tick through bot.logic()
+    python backtest.py market_data/              # what the bot's recorder captured
+
+ticks.csv has a header and one row per observation: timestamp,mint,price
+(timestamp in unix seconds; an optional symbol column is used in reports).
+"""
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from datetime import datetime
+import argparse
+import csv
+import io
+import itertools
+import os
+
+import numpy as np
+
+import bot
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# LOADING TICKS
+# ═══════════════════════════════════════════════════════════════════════
+
+def load_ticks(path):
+    """
+    Reads a ticks CSV into {mint: {"symbol", "timestamps", "prices"}},
+    each series sorted by time.
+    """
+    rows = {}
+
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            series = rows.setdefault(row["mint"], {"symbol": row.get("symbol") or row["mint"][:6], "ticks": []})
+            series["ticks"].append((float(row["timestamp"]), float(row["price"])))
+
+    series_by_mint = {}
+    for mint, series in rows.items():
+        ticks = sorted(series["ticks"])
+        series_by_mint[mint] = {
+            "symbol": series["symbol"],
+            "timestamps": np.array([t for t, _ in ticks]),
+            "prices": np.array([p for _, p in ticks]),
+        }
+
+    return series_by_mint
+
+
+def load_recorder(directory, days=None):
+    """
+    Same shape as load_ticks(), read from a bot.MarketRecorder directory.
+    Only the timestamp/mint_id/price columns are touched; segments stay memory-mapped.
+    """
+    mints, segments = bot.load_recording(directory, days)
+    segments = [s for s in segments if len(s)]
+    if not segments:
+        return {}
+
+    mint_ids = np.concatenate([s["mint_id"] for s in segments])
+    timestamps = np.concatenate([s["timestamp"] for s in segments])
+    prices = np.concatenate([s["price_usd"] for s in segments])
+
+    keep = ~np.isnan(prices) & (prices > 0)
+    mint_ids, timestamps, prices = mint_ids[keep], timestamps[keep], prices[keep]
+
+    order = np.lexsort((timestamps, mint_ids))
+    mint_ids, timestamps, prices = mint_ids[order], timestamps[order], prices[order]
+    starts = np.flatnonzero(np.r_[True, mint_ids[1:] != mint_ids[:-1]])
+    ends = np.r_[starts[1:], len(mint_ids)]
+
+    series_by_mint = {}
+    for start, end in zip(starts, ends):
+        mint = mints[mint_ids[start]]
+        series_by_mint[mint] = {
+            "symbol": mint[:6],
+            "timestamps": timestamps[start:end],
+            "prices": prices[start:end],
+        }
+
+    return series_by_mint
+
+
+def to_matrix(series_by_mint):
+    """
+    Stacks the series into (tokens x ticks) price/timestamp matrices, NaN-padded.
+    """
+    mints = list(series_by_mint)
+    length = max((len(s["prices"]) for s in series_by_mint.values()), default=0)
+
+    prices = np.full((len(mints), length), np.nan)
+    timestamps = np.full((len(mints), length), np.nan)
+
+    for i, mint in enumerate(mints):
+        n = len(series_by_mint[mint]["prices"])
+        prices[i, :n] = series_by_mint[mint]["prices"]
+        timestamps[i, :n] = series_by_mint[mint]["timestamps"]
+
+    return mints, prices, timestamps
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# VECTORIZED SIMULATION
+# ═══════════════════════════════════════════════════════════════════════
+
+def simulate(prices, params, size_sol=bot.POSITION_SIZE_SOL, slippage_bps=100, fee_sol=0.000005):
+    """
+    Runs every (tp, sl) in params over every token at once.
+
+    prices is (tokens x ticks). Entry follows bot.logic(): buy on quote
+    bot.ENTRY_QUOTE; exits use bot.exit_signals() on every later tick.
+    The simulated executor fills buys slippage_bps above and sells
+    slippage_bps below the quote and charges fee_sol per swap.
+    Positions still open at the end are closed at the last quote ("EOD").
+
+    Returns arrays shaped (params x tokens): exit_tick, exit_price, code
+    (EXIT_TP / EXIT_SL / EXIT_NONE), pnl_sol, pnl_pct, plus entry_price (tokens,).
+    """
+    params = np.asarray(params, dtype=float).reshape(-1, 2)
+    n_params = len(params)
+    n_tokens, n_ticks = prices.shape
+    first_exit_tick = bot.ENTRY_QUOTE + 1
+
+    if n_ticks <= first_exit_tick:
+        empty = np.full((n_params, n_tokens), np.nan)
+        return {
+            "entry_price": np.full(n_tokens, np.nan),
+            "exit_tick": np.full((n_params, n_tokens), -1),
+            "exit_price": empty,
+            "code": np.full((n_params, n_tokens), bot.EXIT_NONE, dtype=np.int8),
+            "pnl_pct": empty,
+            "pnl_sol": empty,
+        }
+
+    valid = ~np.isnan(prices)
+    entry_quote = prices[:, bot.ENTRY_QUOTE]
+    after = prices[:, first_exit_tick:]
+
+    # (params x tokens x ticks) exit codes, same rule as the live book
+    tp = entry_quote[None, :, None] * params[:, 0][:, None, None]
+    sl = entry_quote[None, :, None] * params[:, 1][:, None, None]
+    codes = bot.exit_signals(after[None, :, :], tp, sl)
+
+    hit = codes != bot.EXIT_NONE
+    any_hit = hit.any(axis=2)
+
+    # Unhit positions close at their last quote
+    last_valid = n_ticks - 1 - valid[:, ::-1].argmax(axis=1)
+    last_after = np.maximum(last_valid - first_exit_tick, 0)
+    exit_index = np.where(any_hit, hit.argmax(axis=2), last_after[None, :])
+
+    tokens = np.arange(n_tokens)[None, :]
+    exit_quote = after[tokens, exit_index]
+    exit_code = np.where(any_hit, codes[np.arange(n_params)[:, None], tokens, exit_index], bot.EXIT_NONE)
+
+    slip = slippage_bps / 10000
+    fill_in = entry_quote * (1 + slip)
+    fill_out = exit_quote * (1 - slip)
+
+    pnl_pct = (fill_out / fill_in[None, :] - 1) * 100
+    pnl_sol = size_sol * pnl_pct / 100 - 2 * fee_sol
+
+    has_trade = ~np.isnan(entry_quote)[None, :] & ~np.isnan(exit_quote)
+
+    return {
+        "entry_price": entry_quote,
+        "exit_tick": np.where(has_trade, exit_index + first_exit_tick, -1),
+        "exit_price": np.where(has_trade, exit_quote, np.nan),
+        "code": np.where(has_trade, exit_code, bot.EXIT_NONE).astype(np.int8),
+        "pnl_pct": np.where(has_trade, pnl_pct, np.nan),
+        "pnl_sol": np.where(has_trade, pnl_sol, np.nan),
+    }
+
+
+def score(result, exit_times):
+    """
+    Per-parameter-set metrics from simulate(): trades, wins, win rate,
+    total PnL and max drawdown of the equity curve (trades in exit order).
+    """
+    pnl = result["pnl_sol"]
+    n_params = pnl.shape[0]
+    metrics = []
+
+    for p in range(n_params):
+        traded = ~np.isnan(pnl[p])
+        order = np.argsort(exit_times[p][traded], kind="stable")
+        curve = np.cumsum(pnl[p][traded][order])
+        peak = np.maximum.accumulate(np.concatenate([[0.0], curve]))[1:]
+        drawdown = float((peak - curve).max()) if len(curve) else 0.0
+        trades = int(traded.sum())
+        wins = int((pnl[p][traded] > 0).sum())
+
+        metrics.append({
+            "trades": trades,
+            "wins": wins,
+            "win_rate": wins / trades * 100 if trades else 0.0,
+            "total_pnl_sol": float(curve[-1]) if len(curve) else 0.0,
+            "max_drawdown_sol": drawdown,
+        })
+
+    return metrics
+
+
+def _run_chunk(args):
+    prices, timestamps, params, size_sol, slippage_bps, fee_sol = args
+    result = simulate(prices, params, size_sol, slippage_bps, fee_sol)
+    exit_ticks = np.maximum(result["exit_tick"], 0)
+    exit_times = np.take_along_axis(
+        np.broadcast_to(timestamps, (len(params),) + timestamps.shape), exit_ticks[:, :, None], axis=2
+    )[:, :, 0]
+    return score(result, exit_times)
+
+
+def sweep(prices, timestamps, params, workers=None, size_sol=bot.POSITION_SIZE_SOL, slippage_bps=100, fee_sol=0.000005):
+    """
+    Scores every (tp, sl) in params, spreading chunks of the grid over a process pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, -(-len(params) // workers))
+    chunks = [params[i:i + chunk_size] for i in range(0, len(params), chunk_size)]
+
+    if workers == 1 or len(chunks) == 1:
+        return _run_chunk((prices, timestamps, params, size_sol, slippage_bps, fee_sol))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = [(prices, timestamps, chunk, size_sol, slippage_bps, fee_sol) for chunk in chunks]
+        return [m for chunk_metrics in pool.map(_run_chunk, jobs) for m in chunk_metrics]
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# REPORTING
+# ═══════════════════════════════════════════════════════════════════════
+
+def to_trades(result, p, mints, symbols, timestamps, size_sol=bot.POSITION_SIZE_SOL):
+    """
+    Turns one parameter set's results into trade dicts shaped like
+    bot.log_trade(), so bot.generate_daily_summary() can report them.
+    PnL is net of slippage and fees, on the same pnl_sol basis as score()
+    (so wins agree with the sweep table): pnl_pct is pnl_sol over the
+    position size, pnl_usd that return on one token at the entry price.
+    """
+    trades = []
+    labels = {bot.EXIT_TP: "TP", bot.EXIT_SL: "SL", bot.EXIT_NONE: "EOD"}
+
+    for i, mint in enumerate(mints):
+        if result["exit_tick"][p, i] < 0:
+            continue
+        entry = float(result["entry_price"][i])
+        exit_price = float(result["exit_price"][p, i])
+        pnl_sol = float(result["pnl_sol"][p, i])
+        net_return = pnl_sol / size_sol
+        trades.append({
+            "timestamp": datetime.fromtimestamp(timestamps[i, result["exit_tick"][p, i]]),
+            "token": symbols[i],
+            "entry": entry,
+            "exit": exit_price,
+            "pnl_usd": entry * net_return,
+            "pnl_pct": net_return * 100,
+            "pnl_sol": pnl_sol,
+            "result": labels[int(result["code"][p, i])],
+        })
+
+    trades.sort(key=lambda t: t["timestamp"])
+    return trades
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# TICK-BY-TICK REPLAY
+# ═══════════════════════════════════════════════════════════════════════
+
+class SimulatedExecutor(Executor):
+    """
+    Stand-in for buy_token: fills at the last quote plus slippage,
+    one unit of token per unit of SOL spent at that price. Also stands in
+    for the trade pool, running each buy inline so replays are repeatable.
+    """
+
+    def __init__(self, slippage_bps=100):
+        self.slippage_bps = slippage_bps
+        self.quotes = {}
+        self.buys = 0
+
+    def buy(self, TOKEN_MINT, amount_sol, on_signed=None):
+        self.buys += 1
+        price = self.quotes[TOKEN_MINT] * (1 + self.slippage_bps / 10000)
+        return max(1, int(amount_sol / price * 1e9)), None
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class NullNotifier:
+    """
+    Takes the NotificationDispatcher's place during a replay: messages are
+    kept (for inspection) instead of sent.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def submit(self, message, key=None, droppable=False, chat_id=None):
+        self.messages.append(message)
+        return True
+
+
+@contextmanager
+def offline():
+    """
+    Swaps the bot's notifier, trade history, daily totals and journal for
+    throwaway ones while bot.logic() runs on historical ticks, so nothing
+    reaches Telegram or the live day's record. Yields the throwaway history.
+    """
+    saved = bot.notifications, bot.trade_history, bot.daily_stats, bot.journal
+    bot.notifications, bot.trade_history, bot.daily_stats, bot.journal = NullNotifier(), [], bot.DailyStats(), None
+    try:
+        yield bot.trade_history
+    finally:
+        bot.notifications, bot.trade_history, bot.daily_stats, bot.journal = saved
+
+
+def replay(series_by_mint, tp=bot.TAKE_PROFIT, sl=bot.STOP_LOSS, quiet=True):
+    """
+    Feeds every tick, in time order, through the real bot.logic() with a
+    simulated executor, offline(). Slower than simulate() but runs the exact
+    live code path; useful to check the vectorized engine against it.
+    Returns the trades logic() logged.
+    """
+    book = bot.PositionBook(capacity=len(series_by_mint), tp=tp, sl=sl)
+    executor = SimulatedExecutor()
+
+    for mint, series in series_by_mint.items():
+        book.watch(mint, series["symbol"])
+
+    ticks = sorted(
+        (t, mint, p)
+        for mint, series in series_by_mint.items()
+        for t, p in zip(series["timestamps"], series["prices"])
+    )
+
+    with offline() as trades, redirect_stdout(io.StringIO()) if quiet else nullcontext():
+        for t, mint, price in ticks:
+            executor.quotes[mint] = price
+            at = datetime.fromtimestamp(t)
+            for slot, _action in bot.logic({mint: price}, book=book, buy=executor.buy, at=at,
+                                         executor=executor):
+                book.release(slot)
+
+    return trades
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# CLI
+# ═══════════════════════════════════════════════════════════════════════
+
+def _floats(text):
+    return [float(x) for x in text.split(",") if x]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest TP/SL rules on recorded ticks")
+    parser.add_argument("ticks", help="ticks CSV (timestamp,mint,price[,symbol]) or a recorder directory")
+    parser.add_argument("--tp", type=_floats, default=[bot.TAKE_PROFIT], help="comma-separated TP multiples")
+    parser.add_argument("--sl", type=_floats, default=[bot.STOP_LOSS], help="comma-separated SL multiples")
+    parser.add_argument("--size", type=float, default=bot.POSITION_SIZE_SOL, help="SOL per trade")
+    parser.add_argument("--slippage-bps", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="processes for the sweep")
+    parser.add_argument("--top", type=int, default=10, help="parameter sets to list")
+    parser.add_argument("--replay", action="store_true", help="run the first TP/SL through bot.logic() tick by tick")
+    args = parser.parse_args()
+
+    series_by_mint = load_recorder(args.ticks) if os.path.isdir(args.ticks) else load_ticks(args.ticks)
+    if not series_by_mint:
+        print("No ticks found")
+        return
+
+    if args.replay:
+        trades = replay(series_by_mint, tp=args.tp[0], sl=args.sl[0])
+        print(bot.generate_daily_summary(trades))
+        return
+
+    mints, prices, timestamps = to_matrix(series_by_mint)
+    symbols = [series_by_mint[m]["symbol"] for m in mints]
+    params = np.array(list(itertools.product(args.tp, args.sl)))
+
+    print(f"Backtesting {len(params)} parameter sets over {len(mints)} tokens ({int((~np.isnan(prices)).sum())} ticks)")
+
+    metrics = sweep(prices, timestamps, params, args.workers, args.size, args.slippage_bps)
+    ranked = sorted(range(len(params)), key=lambda i: metrics[i]["total_pnl_sol"], reverse=True)
+
+    print(f"\n{'TP':>6} {'SL':>6} {'Trades':>7} {'Win %':>7} {'PnL (SOL)':>11} {'Max DD (SOL)':>13}")
+    for i in ranked[:args.top]:
+        m = metrics[i]
+        print(f"{params[i][0]:>6.2f} {params[i][1]:>6.2f} {m['trades']:>7} {m['win_rate']:>7.1f} "
+              f"{m['total_pnl_sol']:>11.5f} {m['max_drawdown_sol']:>13.5f}")
+
+    best = ranked[0]
+    result = simulate(prices, params[best:best + 1], args.size, args.slippage_bps)
+    trades = to_trades(result, 0, mints, symbols, timestamps, args.size)
+
+    print(f"\nBest: TP {params[best][0]:.2f} / SL {params[best][1]:.2f}\n")
+    print(bot.generate_daily_summary(trades))
+    print(f"Max Drawdown: {metrics[best]['max_drawdown_sol']:.5f} SOL")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1016 @@
+"""
+Benchmarks the bot against local stand-ins for DexScreener, Jupiter, the
+Solana RPC (HTTP and websocket) and Telegram, so performance changes can
+be measured without mainnet or live third-party APIs.
+
+    python bench.py                                   # every scenario
+    python bench.py scan trade --duration 15
+    python bench.py --latency 80 --jitter 30 --error-rate 0.02 --rate-429 0.05
+    python bench.py scan --rpc-endpoints 3 --slow-rpc-latency 400
+    python bench.py --save baseline.json
+    python bench.py --compare baseline.json           # exit 1 on regressions
+    python bench.py shards --wallets 4
+
+Scenarios:
+    startup  import time and the parallel connection warm-up main() starts with
+    scan     get_token_signal() back to back on a cold cache (scan throughput)
+    trade    synthetic ticks through process_prices(): logic(), buy_token(),
+             sell_token() (tick-to-trade and exit latency)
+    main     the real main() loop, end to end, for --duration seconds
+    shards   supervise() with --wallets worker processes, end to end (run
+             on its own: it replaces main() and never returns either)
+"""
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import base64
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import random
+import socketserver
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+from solders.hash import Hash
+from solders.keypair import Keypair
+from solders.message import MessageV0
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.system_program import TransferParams, transfer
+from solders.transaction import VersionedTransaction
+
+bot = None  # imported by load_bot() once the stand-ins' URLs are in the environment
+import_seconds = None  # how long that import took
+
+SCENARIOS = ("startup", "scan", "trade", "main", "shards")
+
+RAYDIUM_AMM_V4 = "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8"
+WSOL_MINT = "So11111111111111111111111111111111111111112"
+USDC_MINT = "EPjFWdd5AufqSSqeM2qN1xzybapC8G4wEGGkZwyTDt1v"
+SOL_USD = 150.0
+TOKEN_DECIMALS = 6
+SOL_DECIMALS = 9
+USDC_DECIMALS = 6
+
+REGRESSION_FLOOR_MS = 1.0  # latency changes smaller than this are noise
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# SERVICE PROFILES
+# ═══════════════════════════════════════════════════════════════════════
+
+class Profile:
+    """
+    Latency and failure injection for one stand-in: every request waits
+    latency_ms +/- jitter_ms (normal), then fails with 429 (rate_429) or
+    503 (error_rate) before doing any work.
+    """
+
+    def __init__(self, latency_ms=20, jitter_ms=5, error_rate=0.0, rate_429=0.0, retry_after=1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+
+    def delay(self):
+        return max(0.0, random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+
+    def failure(self):
+        roll = random.random()
+        if roll < self.rate_429:
+            return 429
+        if roll < self.rate_429 + self.error_rate:
+            return 503
+        return None
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# SYNTHETIC MARKET
+# ═══════════════════════════════════════════════════════════════════════
+
+def _address():
+    return str(Keypair().pubkey())
+
+
+class Market:
+    """
+    Synthetic tokens, each in a Raydium v4 pool against WSOL, whose prices
+    follow a random walk stepped every tick_interval. Every step is a new
+    slot; listeners (the websocket stand-in) are told which pools moved.
+    """
+
+    def __init__(self, n_tokens=20, tick_interval=0.2, volatility=0.02, seed=7):
+        self.tick_interval = tick_interval
+        self.volatility = volatility
+        self.rng = random.Random(seed)
+        self.slot = 1_000_000
+        self.listeners = []
+        self.stepped = threading.Condition()
+        self.tokens = []
+        self.by_address = {}
+        self._thread = None
+
+        now_ms = int(time.time() * 1000)
+        for i in range(n_tokens):
+            token = {
+                "mint": _address(),
+                "symbol": f"BENCH{i}",
+                "pair": _address(),
+                "base_vault": _address(),
+                "quote_vault": _address(),
+                "price": self.rng.uniform(0.0001, 0.01),
+                "base_reserve": self.rng.uniform(1e7, 1e8),
+                "created_ms": now_ms - self.rng.randint(1, 120) * 60_000,
+            }
+            self.tokens.append(token)
+            for key in ("mint", "pair", "base_vault", "quote_vault"):
+                self.by_address[token[key]] = token
+
+        # The SOL/USDC pool the bot converts SOL prices with
+        self.sol_pool = {
+            "mint": WSOL_MINT,
+            "quote_mint": USDC_MINT,
+            "pair": _address(),
+            "base_vault": _address(),
+            "quote_vault": _address(),
+            "base_reserve": 1e5,
+        }
+        for key in ("pair", "base_vault", "quote_vault"):
+            self.by_address[self.sol_pool[key]] = self.sol_pool
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="market", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick_interval)
+            self.step()
+
+    def step(self):
+        with self.stepped:
+            self.slot += 1
+            for token in self.tokens:
+                token["price"] *= math.exp(self.rng.gauss(0, self.volatility))
+            self.stepped.notify_all()
+
+        for listener in self.listeners:
+            listener(self.slot, self.tokens)
+
+    def wait_step(self, timeout=None):
+        with self.stepped:
+            slot = self.slot
+            self.stepped.wait_for(lambda: self.slot != slot, timeout)
+
+    def prices(self, mints):
+        return {m: self.by_address[m]["price"] for m in mints if m in self.by_address}
+
+    def quote_reserve(self, token):
+        return token["base_reserve"] * token["price"] / SOL_USD
+
+    def pair_json(self, token):
+        price = token["price"]
+        return {
+            "chainId": "solana",
+            "dexId": "raydium",
+            "pairAddress": token["pair"],
+            "baseToken": {"address": token["mint"], "symbol": token["symbol"], "name": token["symbol"]},
+            "quoteToken": {"address": WSOL_MINT, "symbol": "SOL", "name": "Wrapped SOL"},
+            "priceNative": f"{price / SOL_USD:.12g}",
+            "priceUsd": f"{price:.12g}",
+            "txns": {"m5": {"buys": self.rng.randint(5, 200), "sells": self.rng.randint(5, 200)}},
+            "volume": {"m5": round(self.rng.uniform(1e3, 1e5), 2)},
+            "priceChange": {"m5": round(self.rng.uniform(-20, 20), 2)},
+            "liquidity": {"usd": round(2 * self.quote_reserve(token) * SOL_USD, 2)},
+            "fdv": round(price * 1e9, 2),
+            "pairCreatedAt": token["created_ms"],
+        }
+
+    def pool_account(self, token):
+        """
+        Raw Raydium v4 pool account: only the decimals, vault and mint fields
+        are filled in (no PnL pending, so the vaults are the reserves).
+        """
+        data = bytearray(752)
+        if token is self.sol_pool:
+            decimals = (SOL_DECIMALS, USDC_DECIMALS)
+        else:
+            decimals = (TOKEN_DECIMALS, SOL_DECIMALS)
+        data[32:40] = decimals[0].to_bytes(8, "little")
+        data[40:48] = decimals[1].to_bytes(8, "little")
+        for offset, address in ((336, token["base_vault"]), (368, token["quote_vault"]),
+                                (400, token["mint"]), (432, token.get("quote_mint", WSOL_MINT))):
+            data[offset:offset + 32] = bytes(Pubkey.from_string(address))
+        return bytes(data)
+
+    def account(self, address):
+        """
+        Pool (base64) or vault (jsonParsed) account at address, else None.
+        """
+        token = self.by_address.get(address)
+        if token is None or address == token["mint"]:
+            return None
+        if address == token["pair"]:
+            return {
+                "owner": RAYDIUM_AMM_V4,
+                "lamports": 6124800,
+                "executable": False,
+                "data": [base64.b64encode(self.pool_account(token)).decode(), "base64"],
+            }
+        return self.vault_account(address)
+
+    def vault_account(self, address):
+        token = self.by_address[address]
+        if token is self.sol_pool:
+            if address == token["base_vault"]:
+                mint, amount, decimals = WSOL_MINT, token["base_reserve"], SOL_DECIMALS
+            else:
+                mint, amount, decimals = USDC_MINT, token["base_reserve"] * SOL_USD, USDC_DECIMALS
+        elif address == token["base_vault"]:
+            mint, amount, decimals = token["mint"], token["base_reserve"], TOKEN_DECIMALS
+        else:
+            mint, amount, decimals = WSOL_MINT, self.quote_reserve(token), SOL_DECIMALS
+        return _token_account(mint, address, int(amount * 10 ** decimals), decimals)
+
+
+def _token_account(mint, owner, amount, decimals):
+    return {
+        "owner": "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA",
+        "lamports": 2039280,
+        "executable": False,
+        "data": {
+            "program": "spl-token",
+            "parsed": {
+                "type": "account",
+                "info": {
+                    "mint": mint,
+                    "owner": owner,
+                    "tokenAmount": {
+                        "amount": str(amount),
+                        "decimals": decimals,
+                        "uiAmount": amount / 10 ** decimals,
+                        "uiAmountString": str(amount / 10 ** decimals),
+                    },
+                },
+            },
+        },
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# HTTP STAND-INS
+# ═══════════════════════════════════════════════════════════════════════
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        service = self.server.service
+        profile = service.profile
+
+        time.sleep(profile.delay())
+
+        failure = profile.failure()
+        with service.lock:
+            service.requests += 1
+            if failure:
+                service.failures[failure] = service.failures.get(failure, 0) + 1
+
+        if failure:
+            self._reply(failure, {"error": "injected"}, {"Retry-After": str(profile.retry_after)})
+            return
+
+        try:
+            status, payload = service.handle(method, urlparse(self.path), body)
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        self._reply(status, payload)
+
+    def _reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Service(ABC):
+    """
+    One stand-in HTTP API on its own local port. production_host is the
+    host it plays: the bot gives it that host's rate limits.
+    """
+
+    name = "service"
+    production_host = None
+
+    def __init__(self, market, profile):
+        self.market = market
+        self.profile = profile
+        self.requests = 0
+        self.failures = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        threading.Thread(target=self.server.serve_forever, name=self.name, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @abstractmethod
+    def handle(self, method, url, body):
+        """
+        Answers one request. Returns (HTTP status, JSON-able payload).
+        """
+
+
+class DexScreenerStandIn(Service):
+    name = "dexscreener"
+    production_host = "api.dexscreener.com"
+
+    def handle(self, method, url, body):
+        if url.path == "/token-boosts/latest/v1":
+            tokens = self.market.rng.sample(self.market.tokens, min(30, len(self.market.tokens)))
+            return 200, [{"chainId": "solana", "tokenAddress": t["mint"], "amount": 100} for t in tokens]
+
+        if url.path.startswith("/latest/dex/tokens/"):
+            addresses = url.path.rsplit("/", 1)[1].split(",")
+            pairs = [
+                self.market.pair_json(self.market.by_address[a])
+                for a in addresses if a in self.market.by_address
+            ]
+            return 200, {"schemaVersion": "1.0.0", "pairs": pairs or None}
+
+        return 404, {"error": "not found"}
+
+
+class JupiterStandIn(Service):
+    name = "jupiter"
+    production_host = "quote-api.jup.ag"
+
+    def handle(self, method, url, body):
+        if url.path.endswith("/quote"):
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+            if "amount" not in params:
+                return 400, {"error": "missing amount"}
+
+            amount = int(params["amount"])
+
+            if params["inputMint"] == WSOL_MINT:
+                token = self.market.by_address[params["outputMint"]]
+                out = amount / 10 ** SOL_DECIMALS * SOL_USD / token["price"] * 10 ** TOKEN_DECIMALS
+            else:
+                token = self.market.by_address[params["inputMint"]]
+                out = amount / 10 ** TOKEN_DECIMALS * token["price"] / SOL_USD * 10 ** SOL_DECIMALS
+
+            slippage_bps = int(params.get("slippageBps", 50))
+            return 200, {
+                "inputMint": params["inputMint"],
+                "inAmount": str(amount),
+                "outputMint": params["outputMint"],
+                "outAmount": str(int(out)),
+                "otherAmountThreshold": str(int(out * (1 - slippage_bps / 10000))),
+                "swapMode": "ExactIn",
+                "slippageBps": slippage_bps,
+                "priceImpactPct": "0.001",
+                "routePlan": [],
+                "contextSlot": self.market.slot,
+            }
+
+        if url.path.endswith("/swap"):
+            request = json.loads(body)
+            payer = Pubkey.from_string(request["userPublicKey"])
+            # A one-lamport self-transfer stands in for the route; a fresh
+            # blockhash makes every transaction (and signature) unique.
+            message = MessageV0.try_compile(
+                payer, [transfer(TransferParams(from_pubkey=payer, to_pubkey=payer, lamports=1))], [], Hash.new_unique()
+            )
+            txn = VersionedTransaction.populate(message, [Signature.default()])
+            return 200, {
+                "swapTransaction": base64.b64encode(bytes(txn)).decode(),
+                "lastValidBlockHeight": self.market.slot + 150,
+            }
+
+        return 404, {"error": "not found"}
+
+
+class RpcStandIn(Service):
+    """
+    JSON-RPC (single and batch) for the methods the bot calls. Transactions
+    confirm confirm_delay seconds after they are first sent; drop_rate of
+    sends are acknowledged but never land, like a congested leader's.
+    Stand-ins for a multi-endpoint pool share one sent dict, like nodes
+    share a chain.
+    """
+
+    name = "rpc"
+    production_host = "api.mainnet-beta.solana.com"
+
+    def __init__(self, market, profile, confirm_delay=0.4, sent=None, drop_rate=0.0):
+        super().__init__(market, profile)
+        self.confirm_delay = confirm_delay
+        self.drop_rate = drop_rate
+        self.sent = {} if sent is None else sent  # signature -> (first sent at, slot)
+
+    def handle(self, method, url, body):
+        request = json.loads(body)
+        if isinstance(request, list):
+            return 200, [self._call(r) for r in request]
+        return 200, self._call(request)
+
+    def _call(self, request):
+        handler = getattr(self, f"rpc_{request['method']}", None)
+        if handler is None:
+            return {"jsonrpc": "2.0", "id": request.get("id"),
+                    "error": {"code": -32601, "message": "Method not found"}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": handler(*request.get("params", []))}
+
+    def _context(self, value):
+        return {"context": {"slot": self.market.slot}, "value": value}
+
+    def rpc_sendTransaction(self, raw, options=None):
+        txn = VersionedTransaction.from_bytes(base64.b64decode(raw))
+        signature = str(txn.signatures[0])
+        if random.random() < self.drop_rate:
+            return signature
+        with self.lock:
+            self.sent.setdefault(signature, (time.time(), self.market.slot))
+        return signature
+
+    def rpc_getSignatureStatuses(self, signatures, options=None):
+        statuses = []
+        for signature in signatures:
+            sent = self.sent.get(signature)
+            if sent is None or time.time() - sent[0] < self.confirm_delay:
+                statuses.append(None)
+            else:
+                statuses.append({"slot": sent[1] + 1, "confirmations": None, "err": None,
+                                 "confirmationStatus": "confirmed"})
+        return self._context(statuses)
+
+    def rpc_getTokenAccountsByOwner(self, owner, mint_filter, options=None):
+        mint = mint_filter["mint"]
+        account = _token_account(mint, owner, 10 ** 9, TOKEN_DECIMALS)
+        return self._context([{"pubkey": _address(), "account": account}])
+
+    def rpc_getTokenLargestAccounts(self, mint, options=None):
+        rng = self.market.rng
+        amounts = sorted((rng.uniform(1e5, 1e6) for _ in range(20)), reverse=True)
+        return self._context([
+            {"address": _address(), "amount": str(int(a * 10 ** TOKEN_DECIMALS)), "decimals": TOKEN_DECIMALS,
+             "uiAmount": a, "uiAmountString": str(a)}
+            for a in amounts
+        ])
+
+    def rpc_getAccountInfo(self, address, options=None):
+        return self._context(self.market.account(address))
+
+    def rpc_getMultipleAccounts(self, addresses, options=None):
+        return self._context([self.market.account(a) for a in addresses])
+
+    def rpc_getRecentPrioritizationFees(self, accounts=None):
+        # Mostly quiet slots with a heavy tail, busier for a specific pool
+        rng = random.Random(hash(tuple(accounts or ())) ^ self.market.slot)
+        scale = 20_000 if accounts else 5_000
+        return [
+            {"slot": slot, "prioritizationFee": int(rng.paretovariate(1.5) * scale) if rng.random() < 0.6 else 0}
+            for slot in range(self.market.slot - 149, self.market.slot + 1)
+        ]
+
+    def rpc_getBlockHeight(self, options=None):
+        return self.market.slot
+
+    def rpc_getSlot(self, options=None):
+        return self.market.slot
+
+
+class TelegramStandIn(Service):
+    name = "telegram"
+    production_host = "api.telegram.org"
+
+    def handle(self, method, url, body):
+        if url.path.endswith("/sendMessage"):
+            return 200, {"ok": True, "result": {"message_id": self.requests}}
+        if url.path.endswith("/getMe"):
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "username": "bench"}}
+        return 404, {"ok": False}
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# WEBSOCKET STAND-IN
+# ═══════════════════════════════════════════════════════════════════════
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _ws_frame(payload, opcode=0x1):
+    header = bytes([0x80 | opcode])
+    n = len(payload)
+    if n < 126:
+        header += bytes([n])
+    elif n < 1 << 16:
+        header += bytes([126]) + struct.pack(">H", n)
+    else:
+        header += bytes([127]) + struct.pack(">Q", n)
+    return header + payload
+
+
+def _ws_read_frame(rfile):
+    head = rfile.read(2)
+    if len(head) < 2:
+        return None, None
+    opcode = head[0] & 0x0F
+    n = head[1] & 0x7F
+    if n == 126:
+        n = struct.unpack(">H", rfile.read(2))[0]
+    elif n == 127:
+        n = struct.unpack(">Q", rfile.read(8))[0]
+    mask = rfile.read(4) if head[1] & 0x80 else None
+    data = rfile.read(n)
+    if mask:
+        data = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+    return opcode, data
+
+
+class _WsHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        headers = {}
+        self.rfile.readline()  # request line
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WS_GUID).encode()).digest()).decode()
+        self.wfile.write(
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode()
+        )
+
+        stand_in = self.server.stand_in
+        self.send_lock = threading.Lock()
+        self.subscriptions = {}  # subscription id -> vault address
+        stand_in.connections.add(self)
+
+        try:
+            while True:
+                opcode, data = _ws_read_frame(self.rfile)
+                if opcode is None or opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    self.send(data, opcode=0xA)
+                elif opcode == 0x1:
+                    stand_in.on_request(self, json.loads(data))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            stand_in.connections.discard(self)
+
+    def send(self, payload, opcode=0x1):
+        if isinstance(payload, dict):
+            payload = json.dumps(payload).encode()
+        with self.send_lock:
+            self.wfile.write(_ws_frame(payload, opcode))
+
+
+class _WsServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class WebsocketStandIn:
+    """
+    Minimal RFC 6455 server speaking the accountSubscribe subset of the
+    Solana pubsub API. Each market step pushes both vaults of every
+    subscribed pool, in the same slot, after the profile's latency.
+    """
+
+    def __init__(self, market, profile):
+        self.market = market
+        self.profile = profile
+        self.connections = set()
+        self.notifications = 0
+        self._ids = iter(range(1, 1 << 62))
+        self.server = None
+
+    def start(self):
+        self.server = _WsServer(("127.0.0.1", 0), _WsHandler)
+        self.server.stand_in = self
+        threading.Thread(target=self.server.serve_forever, name="rpc-ws", daemon=True).start()
+        self.market.listeners.append(self.on_step)
+        return self
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.server.server_address[1]}"
+
+    def on_request(self, connection, request):
+        if request.get("method") == "accountSubscribe":
+            sub_id = next(self._ids)
+            connection.subscriptions[sub_id] = request["params"][0]
+            connection.send({"jsonrpc": "2.0", "id": request["id"], "result": sub_id})
+        elif request.get("method") == "accountUnsubscribe":
+            connection.subscriptions.pop(request["params"][0], None)
+            connection.send({"jsonrpc": "2.0", "id": request["id"], "result": True})
+
+    def on_step(self, slot, tokens):
+        messages = []
+        for connection in list(self.connections):
+            for sub_id, address in list(connection.subscriptions.items()):
+                if address not in self.market.by_address:
+                    continue
+                messages.append((connection, {
+                    "jsonrpc": "2.0",
+                    "method": "accountNotification",
+                    "params": {
+                        "subscription": sub_id,
+                        "result": {"context": {"slot": slot}, "value": self.market.vault_account(address)},
+                    },
+                }))
+
+        if messages:
+            threading.Timer(self.profile.delay(), self._push, [messages]).start()
+
+    def _push(self, messages):
+        for connection, message in messages:
+            try:
+                connection.send(message)
+                self.notifications += 1
+            except OSError:
+                pass
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# SCENARIOS
+# ═══════════════════════════════════════════════════════════════════════
+
+def start_stand_ins(args):
+    """
+    Starts the market and every stand-in. Returns (market, services).
+    """
+    profile = Profile(args.latency, args.jitter, args.error_rate, args.rate_429)
+    rpc_profile = profile
+    if args.slow_rpc_latency is not None:
+        rpc_profile = Profile(args.slow_rpc_latency, args.jitter, args.error_rate, args.rate_429)
+    market = Market(args.tokens, args.tick_interval, args.volatility, args.seed)
+
+    services = {
+        "dexscreener": DexScreenerStandIn(market, profile).start(),
+        "jupiter": JupiterStandIn(market, profile).start(),
+        "rpc": RpcStandIn(market, rpc_profile, args.confirm_delay, drop_rate=args.drop_rate).start(),
+        "telegram": TelegramStandIn(market, profile).start(),
+        "rpc_ws": WebsocketStandIn(market, profile).start(),
+    }
+
+    # Extra pool endpoints run at the normal latency; only the primary is slowed
+    for n in range(2, args.rpc_endpoints + 1):
+        services[f"rpc{n}"] = RpcStandIn(
+            market, profile, args.confirm_delay, sent=services["rpc"].sent, drop_rate=args.drop_rate
+        ).start()
+
+    market.start()
+    return market, services
+
+
+def load_bot(market, services, workdir):
+    """
+    Points the bot at the stand-ins (through its environment overrides)
+    and imports it.
+    """
+    global bot
+
+    os.environ.update({
+        "SOLANA_RPC_URL": services["rpc"].url,
+        "SOLANA_RPC_URLS": ",".join(s.url for name, s in services.items() if name.startswith("rpc") and name != "rpc_ws"),
+        "SOLANA_WS_URL": services["rpc_ws"].url,
+        "DEXSCREENER_API_URL": services["dexscreener"].url,
+        "JUPITER_API_URL": services["jupiter"].url,
+        "TELEGRAM_API_URL": services["telegram"].url,
+        "TELEGRAM_BOT_TOKEN": "bench",
+        "TELEGRAM_CHAT_ID": "1",
+        "SOLANA_PRIVATE_KEY": json.dumps(list(bytes(Keypair()))),
+        "JOURNAL_PATH": os.path.join(workdir, "journal.db"),
+        "RECORDER_DIR": os.path.join(workdir, "market_data"),
+        "METRICS_ENABLED": "false",
+        "SOL_USD_POOL": market.sol_pool["pair"],
+        # Same per-host budgets and priority lanes as against the real APIs
+        "RATE_LIMIT_ALIASES": json.dumps({
+            urlparse(s.url).netloc: s.production_host for s in services.values() if isinstance(s, Service)
+        }),
+    })
+    os.environ.setdefault("SAFETY_CHECKS_ENABLED", "true")
+
+    global import_seconds
+    started = time.perf_counter()
+    import bot as bot_module
+    import_seconds = time.perf_counter() - started
+
+    bot = bot_module
+    return bot
+
+
+def report(line=""):
+    # The bot narrates every step on stdout (silenced unless --verbose);
+    # the report always goes to the real one.
+    print(line, file=sys.__stdout__, flush=True)
+
+
+def run_startup(args, market, services):
+    """
+    Import time (measured by load_bot) plus one prewarm() against the stand-ins.
+    """
+    started = time.perf_counter()
+    warm_times = bot.prewarm()
+    result = {"import_ms": import_seconds * 1000, "prewarm_ms": (time.perf_counter() - started) * 1000}
+    for name, seconds in warm_times.items():
+        result[f"{name}_ms"] = seconds * 1000 if seconds is not None else None
+    return result
+
+
+def run_scan(args, market, services):
+    """
+    get_token_signal() back to back, with a fresh response cache each time.
+    """
+    scans = found = 0
+    started = time.time()
+
+    while time.time() - started < args.duration:
+        bot.response_cache = bot.TTLCache()
+        if bot.get_token_signal(bot.get_client()):
+            found += 1
+        scans += 1
+
+    elapsed = time.time() - started
+    return {"scans": scans, "signals": found, "scans_per_s": scans / elapsed}
+
+
+def run_trade(args, market, services):
+    """
+    Keeps every slot busy with market tokens and feeds each market step
+    through process_prices(), the way main() does after a poll.
+    """
+    book = bot.positions
+    book.tp, book.sl = args.tp, args.sl
+    for slot in book.active_slots():
+        book.release(slot)
+
+    ticks = 0
+    trades_before = len(bot.trade_history)
+    tokens = iter(market.tokens * 1000)
+    started = time.time()
+
+    while time.time() - started < args.duration:
+        while book.free_slots():
+            token = next(tokens)
+            if book.slot_of(token["mint"]) is None:
+                book.watch(token["mint"], token["symbol"], pair=market.pair_json(token))
+
+        market.wait_step(timeout=1)
+        prices = market.prices(book.held_mints())
+        bot.metrics.start_tick()
+        bot.process_prices(prices)
+        ticks += 1
+
+    return {"ticks": ticks, "trades": len(bot.trade_history) - trades_before}
+
+
+def run_main(args, market, services):
+    """
+    Runs the real main() on a daemon thread for --duration seconds.
+    """
+    bot.positions.tp, bot.positions.sl = args.tp, args.sl
+    trades_before = len(bot.trade_history)
+
+    threading.Thread(target=bot.main, name="bot-main", daemon=True).start()
+    time.sleep(args.duration)
+
+    return {"trades": len(bot.trade_history) - trades_before, "held": len(bot.positions.held_mints())}
+
+
+def run_shards(args, market, services):
+    """
+    Runs supervise() on a daemon thread with --wallets worker processes
+    for --duration seconds. Workers journal their fills and positions,
+    which is how they're counted.
+    """
+    bot.SOLANA_PRIVATE_KEYS = json.dumps([list(bytes(Keypair())) for _ in range(args.wallets)])
+
+    # Workers print to the inherited stdout; keep them quiet like the bot
+    stdout = os.dup(1)
+    if not args.verbose:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+    try:
+        threading.Thread(target=bot.supervise, name="bot-supervisor", daemon=True).start()
+        started = time.time()
+        while len(multiprocessing.active_children()) < args.wallets and time.time() - started < 10:
+            time.sleep(0.05)
+    finally:
+        os.dup2(stdout, 1)
+
+    time.sleep(args.duration)
+
+    fills = held = 0
+    for index in range(args.wallets):
+        path = bot.shard_journal_path(bot.shard_label(index))
+        if os.path.exists(path):
+            with sqlite3.connect(path) as db:
+                fills += db.execute("SELECT COUNT(*) FROM events WHERE kind = 'fill'").fetchone()[0]
+                held += db.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+    # os._exit() below skips multiprocessing's cleanup of daemon children
+    for process in multiprocessing.active_children():
+        process.terminate()
+
+    return {"wallets": args.wallets, "fills": fills, "held": held}
+
+
+RUNNERS = {"startup": run_startup, "scan": run_scan, "trade": run_trade, "main": run_main, "shards": run_shards}
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# REPORTING
+# ═══════════════════════════════════════════════════════════════════════
+
+def collect(extra, services):
+    """
+    Flattens bot.metrics plus scenario/stand-in numbers into one result dict.
+    """
+    latencies, counters = bot.metrics.summary()
+
+    result = {"latency_ms": {}, "counters": {}, "scenario": extra, "stand_ins": {}}
+
+    for (name, labels), stats in sorted(latencies.items()):
+        key = name.replace("_seconds", "") + "".join(f"/{v}" for _, v in labels)
+        result["latency_ms"][key] = {
+            "count": stats["count"],
+            "p50": stats["p50"] * 1000,
+            "p99": stats["p99"] * 1000,
+        }
+
+    for (name, labels), value in sorted(counters.items()):
+        result["counters"][name + "".join(f"/{v}" for _, v in labels)] = value
+
+    for name, service in services.items():
+        if isinstance(service, Service):
+            result["stand_ins"][name] = {"requests": service.requests, "failures": dict(service.failures)}
+        else:
+            result["stand_ins"][name] = {"notifications": service.notifications}
+
+    return result
+
+
+def print_result(name, result):
+    report(f"\n== {name} " + "=" * (60 - len(name)))
+    report("  " + ", ".join(f"{k}: {v:.2f}" if isinstance(v, float) else f"{k}: {v}"
+                            for k, v in result["scenario"].items()))
+
+    if result["latency_ms"]:
+        report(f"\n  {'stage':<34} {'count':>7} {'p50 ms':>9} {'p99 ms':>9}")
+        for key, stats in result["latency_ms"].items():
+            report(f"  {key:<34} {stats['count']:>7} {stats['p50']:>9.1f} {stats['p99']:>9.1f}")
+
+    if result["counters"]:
+        report("\n  " + ", ".join(f"{k}: {v}" for k, v in result["counters"].items()))
+
+    report("  stand-ins: " + ", ".join(f"{k} {v}" for k, v in result["stand_ins"].items()))
+
+
+def compare(results, baseline, tolerance):
+    """
+    Lists p50/p99 latencies and throughputs that got worse than baseline
+    by more than tolerance (a fraction).
+    """
+    regressions = []
+
+    for scenario, result in results.items():
+        before = baseline.get(scenario)
+        if not before:
+            continue
+
+        for key, stats in result["latency_ms"].items():
+            old = before["latency_ms"].get(key)
+            if not old:
+                continue
+            for q in ("p50", "p99"):
+                if stats[q] > old[q] * (1 + tolerance) + REGRESSION_FLOOR_MS:
+                    regressions.append(f"{scenario} {key} {q}: {old[q]:.1f} -> {stats[q]:.1f} ms")
+
+        for key, value in result["scenario"].items():
+            old = before["scenario"].get(key)
+            if key.endswith("_per_s") and old and value < old * (1 - tolerance):
+                regressions.append(f"{scenario} {key}: {old:.2f} -> {value:.2f}")
+
+    return regressions
+
+
+# ═══════════════════════════════════════════════════════════════════════
+# CLI
+# ═══════════════════════════════════════════════════════════════════════
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot against local API stand-ins")
+    parser.add_argument("scenarios", nargs="*", help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per scenario")
+    parser.add_argument("--latency", type=float, default=20, help="stand-in latency (ms)")
+    parser.add_argument("--jitter", type=float, default=5, help="latency std deviation (ms)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 503")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--rpc-endpoints", type=int, default=1, help="RPC stand-ins in the bot's endpoint pool")
+    parser.add_argument("--slow-rpc-latency", type=float, help="latency of the primary RPC stand-in (ms)")
+    parser.add_argument("--confirm-delay", type=float, default=0.4, help="seconds until a sent transaction confirms")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of sent transactions that never land")
+    parser.add_argument("--tokens", type=int, default=20, help="synthetic tokens in the market")
+    parser.add_argument("--tick-interval", type=float, default=0.2, help="seconds between market steps")
+    parser.add_argument("--volatility", type=float, default=0.02, help="log-price std deviation per step")
+    parser.add_argument("--tp", type=float, default=1.05, help="take-profit multiple for the trade scenarios")
+    parser.add_argument("--sl", type=float, default=0.95, help="stop-loss multiple for the trade scenarios")
+    parser.add_argument("--wallets", type=int, default=3, help="worker processes for the shards scenario")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from --save; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs baseline (fraction)")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's own console output")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    # main() and supervise() never return, so one of them goes last, alone
+    if {"main", "shards"} <= set(args.scenarios):
+        parser.error("main and shards can't run in the same process")
+    scenarios = [s for s in SCENARIOS if s in (args.scenarios or SCENARIOS[:-1])]
+
+    if not args.verbose:
+        sys.stdout = open(os.devnull, "w")
+
+    market, services = start_stand_ins(args)
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    load_bot(market, services, workdir)
+
+    report(f"Stand-ins: latency {args.latency:.0f}+/-{args.jitter:.0f}ms, "
+           f"503 {args.error_rate:.0%}, 429 {args.rate_429:.0%}; {args.duration:.0f}s per scenario")
+
+    results = {}
+    for name in scenarios:
+        bot.metrics = bot.Metrics()
+        for service in services.values():
+            if isinstance(service, Service):
+                service.requests, service.failures = 0, {}
+        extra = RUNNERS[name](args, market, services)
+        results[name] = collect(extra, services)
+        print_result(name, results[name])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        report(f"\nSaved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            report(f"\nREGRESSIONS (> {args.tolerance:.0%}):")
+            for line in regressions:
+                report(f"  {line}")
+            os._exit(1)
+        report("\nNo regressions against baseline")
+
+    # Daemon threads (main(), stand-ins) go down with the process
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import numpy as np
+
+import backtest
+import bot
+
+
+class RecordingNotifier:
+    def __init__(self):
+        self.messages = []
+
+    def submit(self, message, key=None, droppable=False, chat_id=None):
+        self.messages.append(message)
+        return True
+
+
+def rising_series(mint, start=1.0, step=0.1, ticks=30):
+    prices = start + step * np.arange(ticks)
+    return {mint: {"symbol": mint[:6], "timestamps": 1_700_000_000 + 3.0 * np.arange(ticks), "prices": prices}}
+
+
+def test_replay_has_no_live_side_effects(monkeypatch):
+    live = RecordingNotifier()
+    posted = []
+    monkeypatch.setattr(bot, "notifications", live)
+    monkeypatch.setattr(bot, "_post_telegram_message", lambda *args, **kwargs: posted.append(args))
+    history, stats, journal = bot.trade_history, bot.daily_stats, bot.journal
+
+    trades = backtest.replay(rising_series("MINTAxxxx"), tp=1.5, sl=0.5)
+
+    assert [t["result"] for t in trades] == ["TP"]
+    assert live.messages == [] and posted == []
+    assert bot.trade_history is history and history == []
+    assert bot.daily_stats is stats and stats.trades == 0
+    assert bot.journal is journal
+
+
+def test_replay_stamps_trades_with_tick_times():
+    series = rising_series("MINTBxxxx")
+    trades = backtest.replay(series, tp=1.5, sl=0.5)
+
+    stamps = {t.timestamp() for t in (trade["timestamp"] for trade in trades)}
+    assert stamps <= set(series["MINTBxxxx"]["timestamps"])
@@ -0,0 +1,87 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import bot
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_entries_expire_per_field():
+    cache = bot.TTLCache(field_ttls={"price": 0.05, "liquidity": 10})
+    cache.put("pair", {"priceUsd": "1"})
+
+    assert cache.get("pair", ("price",)) == {"priceUsd": "1"}
+    time.sleep(0.1)
+    assert cache.get("pair", ("price",)) is None
+    assert cache.get("pair", ("liquidity",)) == {"priceUsd": "1"}
+    assert cache.get("pair", ("liquidity", "price")) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = bot.TTLCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def _overlapping_fetches(cache, value):
+    """
+    A leader fetching "k" and a second caller arriving while it's in flight.
+    Returns (leader's result, waiter's result, fetch calls).
+    """
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    results = {}
+
+    def fetch_many(keys):
+        calls.append(keys)
+        started.set()
+        release.wait(5)
+        return {key: value for key in keys}
+
+    def call(name):
+        results[name] = cache.get_or_fetch_many(["k"], fetch_many)
+
+    leader = threading.Thread(target=call, args=("leader",))
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call, args=("waiter",))
+    waiter.start()
+    wait_until(lambda: cache.stats()["misses"] == 2)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    return results["leader"], results["waiter"], calls
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = bot.TTLCache()
+    leader, waiter, calls = _overlapping_fetches(cache, 42)
+
+    assert calls == [["k"]]
+    assert leader == waiter == {"k": 42}
+
+
+def test_waiters_recheck_the_ttl_of_the_shared_fetch(monkeypatch):
+    # Every reading of the clock is a second later, so the entry the leader
+    # stores is already past the 0.5s TTL when the waiter looks it up
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr(bot, "time", SimpleNamespace(time=lambda: next(clock)))
+    cache = bot.TTLCache(field_ttls={"price": 0.5})
+
+    leader, waiter, calls = _overlapping_fetches(cache, 42)
+
+    assert calls == [["k"]]
+    assert leader == {"k": 42}
+    assert waiter == {}
@@ -0,0 +1,57 @@
+import pytest
+
+import bot
+
+BURN = "1nc1nerator11111111111111111111111111111111"
+
+
+def holders(*amounts, burned=()):
+    return [
+        {"address": BURN if i in burned else f"holder{i}", "uiAmount": amount}
+        for i, amount in enumerate(amounts)
+    ]
+
+
+def test_concentration_metrics_on_hand_computed_holdings():
+    result = bot.analyze_holders({
+        "skewed": holders(20, 50, 30),   # unsorted on purpose
+        "even": holders(25, 25, 25, 25),
+    })
+
+    skewed = result["skewed"]
+    # shares .5 / .3 / .2: mean |xi - xj| over all pairs is 2 * .6 / 9, mean share 1/3
+    assert skewed["top_holder_share"] == pytest.approx(0.5)
+    assert skewed["top_n_share"] == pytest.approx(1.0)
+    assert skewed["hhi"] == pytest.approx(0.25 + 0.09 + 0.04)
+    assert skewed["gini"] == pytest.approx((2 * 0.6 / 9) / (2 / 3))
+    assert skewed["burn_share"] == 0
+    assert skewed["accounts"] == 3
+
+    even = result["even"]
+    assert even["hhi"] == pytest.approx(0.25)
+    assert even["gini"] == pytest.approx(0.0)
+    assert even["top_holder_share"] == pytest.approx(0.25)
+
+
+def test_burned_supply_is_left_out_of_the_distribution():
+    result = bot.analyze_holders({"burnt": holders(40, 30, 30, burned={0})})["burnt"]
+
+    # 40 of 100 burned; the 30 / 30 left split evenly between two holders
+    assert result["burn_share"] == pytest.approx(0.4)
+    assert result["top_holder_share"] == pytest.approx(0.5)
+    assert result["hhi"] == pytest.approx(0.5)
+    assert result["gini"] == pytest.approx(0.0)
+    assert result["lp_locked"] is True
+    assert result["is_safe"] is False
+
+
+def test_missing_or_thin_data_passes_without_a_score():
+    result = bot.analyze_holders({"failed": None, "thin": holders(60, 40)})
+
+    assert result["failed"]["accounts"] == 0
+    assert result["failed"]["gini"] == 1.0
+    assert result["failed"]["is_safe"] is True
+    assert result["failed"]["safety_score"] is None
+    assert result["thin"]["is_safe"] is True
+    assert result["thin"]["safety_score"] is None
+    assert bot.analyze_holders({}) == {}
@@ -0,0 +1,43 @@
+import math
+
+import pytest
+
+import bot
+
+
+@pytest.fixture
+def book():
+    book = bot.PositionBook(capacity=2, tp=1.5, sl=0.8)
+    book.fill(book.watch("MINT", "SYM"), 1.0, 100)
+    return book
+
+
+def test_unheld_and_unsettled_tokens_use_fixed_intervals(book):
+    scheduler = bot.PollScheduler(book)
+    book.watch("WATCHED", "W")
+
+    assert scheduler.interval("UNKNOWN") == bot.POLL_BASE_INTERVAL
+    assert scheduler.interval("WATCHED") == bot.POLL_MIN_INTERVAL
+    assert scheduler.interval("MINT") == bot.POLL_BASE_INTERVAL  # no volatility estimate yet
+
+
+def test_interval_scales_with_distance_to_the_nearest_trigger(book):
+    scheduler = bot.PollScheduler(book)
+    scheduler.observe({"MINT": 1.0}, now=100)
+    scheduler.observe({"MINT": math.exp(0.1)}, now=101)
+
+    # Variance (0.1)^2 per second; TP at ln 1.5 - 0.1 is nearer than SL at 0.1 - ln 0.8
+    expected = (math.log(1.5) - 0.1) ** 2 / 0.01
+    assert scheduler.interval("MINT") == pytest.approx(bot.POLL_RISK_FRACTION * expected)
+
+
+def test_interval_is_clamped(book):
+    calm = bot.PollScheduler(book)
+    calm.observe({"MINT": 1.0}, now=100)
+    calm.observe({"MINT": 1.001}, now=200)
+    assert calm.interval("MINT") == bot.POLL_MAX_INTERVAL
+
+    past_sl = bot.PollScheduler(book)
+    past_sl.observe({"MINT": 1.0}, now=100)
+    past_sl.observe({"MINT": 0.7}, now=101)
+    assert past_sl.interval("MINT") == bot.POLL_MIN_INTERVAL
@@ -0,0 +1,83 @@
+import base64
+
+import pytest
+from solders.pubkey import Pubkey
+
+import bot
+
+RAYDIUM_AMM_V4 = "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8"
+RAYDIUM_CPMM = "CPMMoo8L3F4NbTegBCKVNunggL7H1ZpdTHKxQB5qKP1C"
+PUMPSWAP = "pAMMBay6oceH9fJKBRHGP5D4bD4sWpmSwMn52FMfXEA"
+
+BASE_VAULT, QUOTE_VAULT, BASE_MINT, QUOTE_MINT = (bytes([n]) * 32 for n in (1, 2, 3, 4))
+
+
+def key(raw):
+    return str(Pubkey.from_bytes(raw))
+
+
+def blob(size, fields):
+    data = bytearray(size)
+    for offset, raw in fields.items():
+        data[offset:offset + len(raw)] = raw
+    return bytes(data)
+
+
+def u64(n):
+    return n.to_bytes(8, "little")
+
+
+def account(data):
+    return {"data": [base64.b64encode(data).decode(), "base64"]}
+
+
+def test_raydium_v4_pool():
+    data = blob(752, {
+        32: u64(6), 40: u64(9),                       # base / quote decimals
+        192: u64(1_500_000), 200: u64(2_000_000_000),  # PnL not yet taken
+        336: BASE_VAULT, 368: QUOTE_VAULT, 400: BASE_MINT, 432: QUOTE_MINT,
+    })
+
+    pool = bot.decode_pool_account(RAYDIUM_AMM_V4, data)
+
+    assert pool["amm"] == "raydium-amm-v4"
+    assert (pool["base_vault"], pool["quote_vault"]) == (key(BASE_VAULT), key(QUOTE_VAULT))
+    assert (pool["base_mint"], pool["quote_mint"]) == (key(BASE_MINT), key(QUOTE_MINT))
+    assert pool["decimals"] == {"base": 6, "quote": 9}
+    assert bot.pool_fees(pool, account(data)) == pytest.approx({"base": 1.5, "quote": 2.0})
+
+
+def test_raydium_cpmm_fees_add_up():
+    data = blob(637, {
+        72: BASE_VAULT, 104: QUOTE_VAULT, 168: BASE_MINT, 200: QUOTE_MINT,
+        331: bytes([6]), 332: bytes([9]),
+        341: u64(1_000_000), 357: u64(2_000_000), 397: u64(500_000),            # protocol, fund, creator
+        349: u64(1_000_000_000), 365: u64(3_000_000_000), 405: u64(0),
+    })
+
+    pool = bot.decode_pool_account(RAYDIUM_CPMM, data)
+
+    assert pool["amm"] == "raydium-cpmm"
+    assert (pool["base_vault"], pool["quote_mint"]) == (key(BASE_VAULT), key(QUOTE_MINT))
+    assert pool["decimals"] == {"base": 6, "quote": 9}
+    assert bot.pool_fees(pool, account(data)) == pytest.approx({"base": 3.5, "quote": 4.0})
+
+
+def test_pumpswap_vaults_are_the_reserves():
+    data = blob(300, {43: BASE_MINT, 75: QUOTE_MINT, 139: BASE_VAULT, 171: QUOTE_VAULT})
+
+    pool = bot.decode_pool_account(PUMPSWAP, data)
+
+    assert (pool["base_vault"], pool["quote_vault"]) == (key(BASE_VAULT), key(QUOTE_VAULT))
+    assert (pool["base_mint"], pool["quote_mint"]) == (key(BASE_MINT), key(QUOTE_MINT))
+    assert bot.pool_fees(pool, None) is bot.NO_POOL_FEES
+
+
+def test_unknown_or_truncated_accounts_are_not_decoded():
+    assert bot.decode_pool_account("11111111111111111111111111111111", bytes(752)) is None
+    assert bot.decode_pool_account(RAYDIUM_AMM_V4, bytes(440)) is None
+    assert bot.decode_pool_account(RAYDIUM_CPMM, bytes(400)) is None
+
+    pool = bot.decode_pool_account(RAYDIUM_AMM_V4, bytes(752))
+    assert bot.pool_fees(pool, account(bytes(100))) is None
+    assert bot.pool_fees(pool, {}) is None
@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+import bench
+import bot
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def market():
+    # Stepped by hand: no market thread
+    return bench.Market(n_tokens=2, seed=1)
+
+
+@pytest.fixture
+def stream(market, monkeypatch):
+    profile = bench.Profile(latency_ms=0, jitter_ms=0)
+    rpc = bench.RpcStandIn(market, profile).start()
+    ws = bench.WebsocketStandIn(market, profile).start()
+
+    def layout(pair_address):
+        pool = market.by_address[pair_address]
+        return bot.decode_pool_account(bench.RAYDIUM_AMM_V4, market.pool_account(pool))
+
+    monkeypatch.setattr(bot.pool_pricer, "layout", layout)
+
+    stream = bot.PriceStream(ws.url, rpc.url)
+    stream.start()
+    assert stream.connected.wait(5)
+    yield stream
+
+    stream.stop()
+    for server in (rpc.server, ws.server):
+        server.shutdown()
+        server.server_close()
+
+
+def test_streams_the_pool_price_of_watched_tokens(market, stream):
+    token, other = market.tokens
+    assert stream.watch(token["mint"], market.pair_json(token))
+    wait_until(lambda: len(stream._subscriptions) == 2)
+
+    market.step()
+    prices = stream.drain(timeout=5)
+
+    assert list(prices) == [token["mint"]]
+    assert prices[token["mint"]] == pytest.approx(token["price"], rel=1e-5)
+    assert stream.is_live(token["mint"])
+    assert not stream.is_live(other["mint"])
+
+
+def test_unwatched_tokens_stop_streaming(market, stream):
+    token = market.tokens[0]
+    stream.watch(token["mint"], market.pair_json(token))
+    wait_until(lambda: len(stream._subscriptions) == 2)
+    stream.unwatch(token["mint"])
+
+    market.step()
+
+    assert stream.drain(timeout=0.3) == {}
+    assert stream.watched() == []
+
+
+def test_unsupported_pairs_are_left_to_polling(market, stream):
+    token = market.tokens[0]
+
+    assert not stream.watch(token["mint"], None)
+    assert not stream.watch(token["mint"], {**market.pair_json(token), "pairAddress": market.tokens[1]["pair"]})
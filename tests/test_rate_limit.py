@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+import bot
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_higher_priority_waiter_takes_the_next_token():
+    bucket = bot.TokenBucket(rate=4, burst=1)
+    bucket.acquire()
+    order = []
+
+    def take(priority):
+        bucket.acquire(priority, max_wait=5)
+        order.append(priority)
+
+    threads = []
+    for priority in (bot.PRIORITY_SCAN, bot.PRIORITY_PRICE, bot.PRIORITY_TRADE):
+        threads.append(threading.Thread(target=take, args=(priority,)))
+        threads[-1].start()
+        wait_until(lambda: len(bucket._waiters) == len(threads))
+    for thread in threads:
+        thread.join(5)
+
+    assert order == [bot.PRIORITY_TRADE, bot.PRIORITY_PRICE, bot.PRIORITY_SCAN]
+
+
+def test_backoff_longer_than_the_wait_fails_fast():
+    bucket = bot.TokenBucket(rate=100, burst=10)
+    bucket.penalize(30)
+
+    started = time.monotonic()
+    with pytest.raises(bot.RateLimited) as raised:
+        bucket.acquire(bot.PRIORITY_PRICE, max_wait=0.5)
+
+    assert time.monotonic() - started < 0.1
+    assert raised.value.retry_after > 29
+    assert bucket.throttled == 1
+
+
+def test_aliased_hosts_get_their_own_copy_of_the_limits():
+    limiter = bot.RateLimiter(aliases={"127.0.0.1:8001": "api.dexscreener.com"})
+
+    boosts = limiter.bucket_for("http://127.0.0.1:8001/token-boosts/latest/v1")
+    pairs = limiter.bucket_for("http://127.0.0.1:8001/latest/dex/tokens/x")
+
+    assert (boosts.rate, boosts.burst) == bot.RATE_LIMITS["api.dexscreener.com/token-boosts"]
+    assert (pairs.rate, pairs.burst) == bot.RATE_LIMITS["api.dexscreener.com"]
+    assert pairs is not limiter.bucket_for("https://api.dexscreener.com/latest/dex/tokens/x")
+    assert limiter.bucket_for("http://127.0.0.1:8002/quote") is None